@@ -1,19 +1,33 @@
 from typing import List, Optional, Any, Dict
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
-from sqlmodel import Session, select
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import BaseModel, TypeAdapter
 from ..core.db import get_session
+from ..core.config import DATA_DIR
 from ..models.models import Dataset, DatasetBase, ExpectationSuite, ExpectationSuiteBase, ValidationRun
 from ..services import gx_service, ai_service
 from ..core.db_utils import get_db_preview # New utility we will create
-import shutil
+from ..core.csv_preview import preview_csv, iter_csv, row_to_dict
+import aiofiles
+import asyncio
+import csv
+import itertools
 import os
+import sys
+import traceback
 import uuid
 import json
+import orjson
+from functools import lru_cache
 from datetime import datetime
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
 # --- Response Models ---
 
 class ValidationResultItem(BaseModel):
@@ -33,9 +47,12 @@ class ValidationRunResponse(BaseModel):
     score: float
     results: List[ValidationResultItem]
 
+# Compiled once; validating the whole list in one call is much cheaper than per-item constructors
+_ITEMS_ADAPTER = TypeAdapter(List[ValidationResultItem])
+
 def parse_gx_result(raw_result: Dict[str, Any]) -> List[ValidationResultItem]:
     """Parses raw Great Expectations JSON result into frontend-friendly flattened list."""
-    items = []
+    items_raw = []
     try:
         run_results = raw_result.get("run_results", {})
         # There should be one validation ID key
@@ -62,27 +79,28 @@ def parse_gx_result(raw_result: Dict[str, Any]) -> List[ValidationResultItem]:
                 col = kwargs.get("column", "table")
                 exp_id = f"{col}.{exp_type}"
 
-                items.append(ValidationResultItem(
-                    expectationId=exp_id,
-                    success=success,
-                    observedValue=str(observed_val) if observed_val is not None else "N/A",
-                    unexpectedCount=result_info.get("unexpected_count", 0),
-                    unexpectedPercent=result_info.get("unexpected_percent", 0.0),
-                    unexpectedList=result_info.get("partial_unexpected_list", []),
-                    expectationConfig=kwargs
-                ))
+                items_raw.append({
+                    "expectationId": exp_id,
+                    "success": success,
+                    "observedValue": str(observed_val) if observed_val is not None else "N/A",
+                    "unexpectedCount": result_info.get("unexpected_count", 0),
+                    "unexpectedPercent": result_info.get("unexpected_percent", 0.0),
+                    "unexpectedList": result_info.get("partial_unexpected_list", []),
+                    "expectationConfig": kwargs
+                })
+        return _ITEMS_ADAPTER.validate_python(items_raw)
     except Exception as e:
         print(f"Error parsing GX result: {e}")
-    return items
+    return []
 
 # --- Datasets ---
 
 @router.post("/datasets", response_model=Dataset)
-def create_dataset(dataset: Dataset, session: Session = Depends(get_session)):
+async def create_dataset(dataset: Dataset, session: AsyncSession = Depends(get_session)):
     # If it is a DB dataset, try to fetch schema metadata automatically
     if dataset.db_config:
         try:
-            preview = get_db_preview(dataset.db_config)
+            preview = await run_in_threadpool(get_db_preview, dataset.db_config)
             # We can store this in the dataset metadata or just confirm it works
             # For this simplified model, we might just want to ensure we CAN connect.
             # But the user wants REAL data. 
@@ -95,139 +113,109 @@ def create_dataset(dataset: Dataset, session: Session = Depends(get_session)):
             raise HTTPException(status_code=400, detail=f"Failed to connect to database: {str(e)}")
 
     session.add(dataset)
-    session.commit()
-    session.refresh(dataset)
+    await session.commit()
+    await session.refresh(dataset)
     return dataset
 
 @router.post("/datasets/preview")
 def preview_dataset(dataset: Dataset):
     """Stateless preview of a potential dataset config"""
-    if dataset.file_path and os.path.exists(dataset.file_path):
-        import pandas as pd
+    if dataset.file_path:
         try:
-            df = pd.read_csv(dataset.file_path, nrows=5)
-            return {
-                "headers": df.columns.tolist(),
-                "rows": df.where(pd.notnull(df), None).to_dict(orient='records')
-            }
+            return preview_csv(dataset.file_path)
+        except OSError:
+            # Missing/unreadable file: fall through to db_config
+            pass
         except:
              return {"headers": [], "rows": []}
              
-    elif dataset.db_config:
+    if dataset.db_config:
         try:
             print(f"[DEBUG] Attempting DB preview with config: {dataset.db_config}")
             result = get_db_preview(dataset.db_config)
             print(f"[DEBUG] DB preview successful")
             return result
         except Exception as e:
-            import traceback
             print(f"[ERROR] DB preview failed: {str(e)}")
             traceback.print_exc()
             raise HTTPException(status_code=400, detail=str(e))
     return {"headers": [], "rows": []}
 
 @router.get("/datasets", response_model=List[Dataset])
-def read_datasets(session: Session = Depends(get_session)):
-    return session.exec(select(Dataset)).all()
+async def read_datasets(session: AsyncSession = Depends(get_session)):
+    return (await session.exec(select(Dataset))).all()
 
 @router.get("/datasets/{dataset_id}")
-def read_dataset(dataset_id: str, session: Session = Depends(get_session)):
-    dataset = session.get(Dataset, dataset_id)
+async def read_dataset(dataset_id: str, session: AsyncSession = Depends(get_session)):
+    dataset = await session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
-    # Hydrate preview data if file exists
-    if dataset.file_path and os.path.exists(dataset.file_path):
-        import pandas as pd
-        try:
-            df = pd.read_csv(dataset.file_path, nrows=5)
-            # Create a new object or attach attributes if pydantic allows extra fields,
-            # but response_model=Dataset might strip them if not defined in schema.
-            # However, Dataset (Pydantic/SQLModel) doesn't have headers/rows fields in models.py.
-            # We need to rely on the fact that FastAPI returns the object as JSON.
-            # BUT wait, the SQLModel definition in models.py DOES NOT have headers/rows.
-            # The Frontend Dataset interface in types.ts DOES.
-            # If we return 'dataset' as is, it lacks headers/rows.
-            # We must either add non-table fields to the Model or use a specific Response Model.
-            # For simplicity in this fix, let's just make sure the frontend can handle it? 
-            # No, Frontend types expect 'rows'.
-            
-            # Since we can't easily change the SQLModel definition without migration or re-def,
-            # We will use the fact that Python objects can have dynamic attributes,
-            # BUT Pydantic response_model will filter them out if not in the model.
-            
-            # HACK: We should ideally update the Pydantic model. 
-            # But let's check `backend/app/models/models.py`: 
-            # It inherits from DatasetBase.
-            # If we assign `dataset.rows = ...`, Pydantic v2 might ignore it during serialization if not in fields.
-            
-            # Let's try to return a dict representing the dataset + extra fields, 
-            # or rely on the frontend fetching PREVIEW separately?
-            # The user wants "Click -> Preview".
-            
-            # Best approach: Add `headers` and `rows` as Optional fields to `Dataset` model in `models.py` 
-            # with `Field(default=None, sa_column_kwargs={"exclude": True})` or just not `table=True`?
-            # Actually, `Dataset` is `table=True`. Adding fields requires migration if they are columns.
-            # We can subclass it for response: `DatasetRead`?
-            
-            # LET'S DO THIS: 
-            # 1. We will NOT change the model now to avoid migration issues in this session.
-            # 2. We will change the endpoint logic to return a dynamic dict and remove `response_model=Dataset` 
-            #    or use a loose response model.
-            #    Actually, removing `response_model` allows returning any dict.
-            
-            pass
-        except:
-             pass
-             
-    # For now, let's try populating it and assume we verify `models.py` can accept ignored fields?
-    # No, SQLModel is strict.
-    
     # STRATEGY CHANGE: I will update `read_dataset` to return a `dict` merging the DB object and the file content.
     # I will remove `response_model=Dataset` from the decorator to allow the extra fields.
+    # The body is streamed: dataset fields and headers first, then rows as they are read from the file.
     
-    response_data = dataset.model_dump()
-    response_data["headers"] = []
-    response_data["rows"] = []
-    
-    if dataset.file_path and os.path.exists(dataset.file_path):
-        import pandas as pd
+    headers = []
+    # A generator either way, so _gen can close() it; one whose header read raised is already
+    # finished and yields no rows
+    rows = iter_csv(dataset.file_path) if dataset.file_path else (r for r in ())
+    if dataset.file_path:
         try:
-            df = pd.read_csv(dataset.file_path, nrows=5)
-            # Fill NaN with None for JSON compliance
-            df_clean = df.where(pd.notnull(df), None)
-            response_data["headers"] = df.columns.tolist()
-            response_data["rows"] = df_clean.to_dict(orient='records')
+            # Opening the file and reading the header are blocking I/O; keep them off the loop
+            headers = await asyncio.to_thread(next, rows, [])
+        except FileNotFoundError:
+            pass
         except Exception as e:
             print(f"Preview fetch error: {e}")
 
-    return response_data
+    head = orjson.dumps(dataset.model_dump(mode="json"))
+
+    def _gen():
+        # Sync generator: Starlette iterates it in the threadpool, so row reads don't block the loop.
+        # Splice headers/rows into the dataset object: drop its closing brace and append the extra keys
+        try:
+            yield head[:-1] + b',"headers":' + orjson.dumps(headers) + b',"rows":['
+            try:
+                for i, row in enumerate(rows):
+                    yield (b',' if i else b'') + orjson.dumps(row_to_dict(headers, row))
+            except Exception as e:
+                print(f"Preview fetch error: {e}")
+            yield b']}'
+        finally:
+            # Releases the file handle even if the client abandons the stream
+            rows.close()
+
+    return StreamingResponse(_gen(), media_type="application/json")
 
 @router.delete("/datasets/{dataset_id}")
-def delete_dataset(dataset_id: str, hard_delete: bool = True, session: Session = Depends(get_session)):
-    dataset = session.get(Dataset, dataset_id)
+async def delete_dataset(dataset_id: str, hard_delete: bool = True, session: AsyncSession = Depends(get_session)):
+    dataset = await session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
         
     # Optional: Delete physical file
-    if hard_delete and dataset.file_path and os.path.exists(dataset.file_path):
+    if hard_delete and dataset.file_path:
         try:
             os.remove(dataset.file_path)
+        except FileNotFoundError:
+            pass
         except OSError as e:
             # We log but proceed with DB deletion so we don't get stuck
             print(f"Error deleting file {dataset.file_path}: {e}")
+        # Don't keep the deleted file's parsed frame alive in the validation cache
+        gx_service.forget_csv_cache()
             
     # Cascade delete is handled by SQLModel/SQLAlchemy if configured, 
     # but here we might need to manually delete suites/runs if cascade isn't set up perfectly in SQLite.
     # For now, let's assume simple deletion of dataset is the goal.
-    session.delete(dataset)
-    session.commit()
+    await session.delete(dataset)
+    await session.commit()
     return {"ok": True}
 
 # --- Suites ---
 
 @router.post("/suites", response_model=ExpectationSuite)
-def create_suite(suite: ExpectationSuite, session: Session = Depends(get_session)):
+async def create_suite(suite: ExpectationSuite, session: AsyncSession = Depends(get_session)):
     # Fix for SQLite DateTime issue (if Pydantic passes string)
     if isinstance(suite.created_at, str):
         try:
@@ -237,29 +225,28 @@ def create_suite(suite: ExpectationSuite, session: Session = Depends(get_session
              # Fallback to now if parse fails
              suite.created_at = datetime.utcnow()
 
-    # Use merge to allow updates (upsert)
-    session.merge(suite)
-    session.commit()
-    # refresh requires the instance to be in session, merge returns a new instance
-    # but for simple return we can just return the input suite or strictly:
-    # merged_instance = session.merge(suite); session.commit(); session.refresh(merged_instance); return merged_instance
-    # But simply returning suite is fine as we trust the merge.
-    # Actually, let's do it properly:
-    saved_suite = session.merge(suite)
-    session.commit()
-    session.refresh(saved_suite)
-    return saved_suite
+    # Upsert: one PK lookup, then either update the loaded row or insert; single commit
+    existing = await session.get(ExpectationSuite, suite.id) if suite.id else None
+    if existing:
+        existing.sqlmodel_update(suite.model_dump(exclude={"id"}))
+        target = existing
+    else:
+        session.add(suite)
+        target = suite
+    await session.commit()
+    await session.refresh(target)
+    return target
 
 @router.get("/suites", response_model=List[ExpectationSuite])
-def read_suites(session: Session = Depends(get_session)):
-    return session.exec(select(ExpectationSuite)).all()
+async def read_suites(session: AsyncSession = Depends(get_session)):
+    return (await session.exec(select(ExpectationSuite))).all()
 
 # --- Validation Runs (History) ---
 
 @router.post("/validate/{dataset_id}/{suite_id}", response_model=ValidationRunResponse)
-async def run_validation(dataset_id: str, suite_id: str, session: Session = Depends(get_session)):
-    dataset = session.get(Dataset, dataset_id)
-    suite = session.get(ExpectationSuite, suite_id)
+async def run_validation(dataset_id: str, suite_id: str, session: AsyncSession = Depends(get_session)):
+    dataset = await session.get(Dataset, dataset_id)
+    suite = await session.get(ExpectationSuite, suite_id)
     
     if not dataset or not suite:
         raise HTTPException(status_code=404, detail="Resource not found")
@@ -268,7 +255,6 @@ async def run_validation(dataset_id: str, suite_id: str, session: Session = Depe
     try:
         raw_result = await gx_service.run_validation(dataset, suite)
     except Exception as e:
-        import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -295,16 +281,20 @@ async def run_validation(dataset_id: str, suite_id: str, session: Session = Depe
     except:
         pass
 
+    # Flattening large results is pure CPU; keep it off the event loop
+    results = await asyncio.to_thread(parse_gx_result, raw_result)
+
     run = ValidationRun(
         suite_id=suite.id,
         success=success,
         score=score,
-        result_json=raw_result
+        result_json=raw_result,
+        results_flat=[item.model_dump() for item in results]
     )
     
     session.add(run)
-    session.commit()
-    session.refresh(run)
+    await session.commit()
+    await session.refresh(run)
     
     return ValidationRunResponse(
         id=run.id,
@@ -312,63 +302,94 @@ async def run_validation(dataset_id: str, suite_id: str, session: Session = Depe
         runTime=run.run_time,
         success=run.success,
         score=run.score,
-        results=parse_gx_result(raw_result)
+        results=results
     )
 
 @router.get("/runs", response_model=List[ValidationRunResponse])
-def read_runs(session: Session = Depends(get_session)):
-    runs = session.exec(select(ValidationRun).order_by(ValidationRun.run_time.desc())).all()
+async def read_runs(session: AsyncSession = Depends(get_session)):
+    # Select only what the list needs: the compressed result_json blob stays in the DB,
+    # and the suite name comes from a join rather than loading ExpectationSuite objects
+    rows = (await session.exec(
+        select(
+            ValidationRun.id,
+            ValidationRun.run_time,
+            ValidationRun.success,
+            ValidationRun.score,
+            ValidationRun.results_flat,
+            ExpectationSuite.name,
+        )
+        .outerjoin(ExpectationSuite, ValidationRun.suite_id == ExpectationSuite.id)
+        .order_by(ValidationRun.run_time.desc())
+    )).all()
+
+    # Older runs predate results_flat and still need parsing; fetch their raw results in one query
+    legacy_ids = [row[0] for row in rows if row[4] is None]
+    legacy_results = {}
+    if legacy_ids:
+        legacy_results = dict((await session.exec(
+            select(ValidationRun.id, ValidationRun.result_json).where(ValidationRun.id.in_(legacy_ids))
+        )).all())
+
     res = []
-    for r in runs:
-        s_name = "Unknown"
-        try:
-            if r.suite:
-                s_name = r.suite.name
-        except:
-            pass
-            
+    for run_id, run_time, success, score, results_flat, suite_name in rows:
         res.append(ValidationRunResponse(
-            id=r.id,
-            suiteName=s_name,
-            runTime=r.run_time,
+            id=run_id,
+            suiteName=suite_name or "Unknown",
+            runTime=run_time,
             # Fix historical data display: if score is 100, show as success even if DB says False
-            success=r.success or r.score == 100.0,
-            score=r.score,
-            results=parse_gx_result(r.result_json)
+            success=success or score == 100.0,
+            score=score,
+            results=_ITEMS_ADAPTER.validate_python(results_flat)
+                if results_flat is not None else parse_gx_result(legacy_results.get(run_id) or {})
         ))
-    return res
+    # History can be large; serialize directly with orjson and skip jsonable_encoder
+    return ORJSONResponse(content=[item.model_dump(mode="json") for item in res])
 
 @router.delete("/runs/{run_id}")
-def delete_run(run_id: str, session: Session = Depends(get_session)):
-    run = session.get(ValidationRun, run_id)
+async def delete_run(run_id: str, session: AsyncSession = Depends(get_session)):
+    run = await session.get(ValidationRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
     
-    session.delete(run)
-    session.commit()
+    await session.delete(run)
+    await session.commit()
     return {"ok": True}
 
 # --- Uploads ---
 
+def _sendfile_copy(src, dst_path: str) -> None:
+    src_fd = src.fileno()
+    size = os.fstat(src_fd).st_size
+    offset = 0
+    with open(dst_path, "wb") as dst:
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src_fd, offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
 @router.post("/upload")
-def upload_file(file: UploadFile = File(...)):
-    # Ensure data directory exists
-    os.makedirs("data", exist_ok=True)
-    
-    # Generate unique name
+async def upload_file(file: UploadFile = File(...)):
+    # Generate unique name (DATA_DIR is created at startup)
     ext = os.path.splitext(file.filename)[1]
     filename = f"{uuid.uuid4()}{ext}"
-    file_path = f"data/{filename}"
+    file_path = str(DATA_DIR / filename)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    src = file.file
+    if sys.platform == "linux" and getattr(src, "_rolled", False) and hasattr(src, "fileno"):
+        # Large uploads are already spooled to a real temp file: copy it in-kernel
+        await asyncio.to_thread(_sendfile_copy, src, file_path)
+    else:
+        # Stream in chunks so the event loop stays free and memory stays bounded
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
         
     # Validation / Preview Logic
-    import pandas as pd
     try:
-        df = pd.read_csv(file_path, nrows=5)
-        headers = df.columns.tolist()
-        rows = df.to_dict(orient='records')
+        preview = await asyncio.to_thread(preview_csv, file_path)
+        headers = preview["headers"]
+        rows = preview["rows"]
     except Exception as e:
         print(f"Error parsing CSV: {e}")
         headers = []
@@ -383,12 +404,18 @@ def upload_file(file: UploadFile = File(...)):
 
 # --- AI & Code ---
 
+def _read_sample_lines(path: str, n: int = 10) -> List[str]:
+    # Header + n rows as raw text; no need to parse into a DataFrame and re-serialize.
+    # utf-8-sig drops an Excel BOM so the column names match what validation loads.
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        return list(itertools.islice(f, n + 1))
+
 @router.post("/suggest_expectations")
 async def suggest_expectations(
     dataset_id: str = Body(...),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
-    dataset = session.get(Dataset, dataset_id)
+    dataset = await session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
         
@@ -396,12 +423,11 @@ async def suggest_expectations(
     sample_data = ""
     columns = []
     
-    if dataset.file_path and os.path.exists(dataset.file_path):
-        import pandas as pd
-        df = pd.read_csv(dataset.file_path, nrows=10) # Minimal read
-        sample_data = df.to_csv(index=False)
-        columns = df.columns.tolist()
-    else:
+    try:
+        lines = await asyncio.to_thread(_read_sample_lines, dataset.file_path)
+        sample_data = ''.join(lines)
+        columns = next(csv.reader(lines[:1]), [])
+    except (TypeError, OSError):
         # Fallback for DB or missing file
         sample_data = "No data preview available"
         columns = ["col1", "col2"]
@@ -422,38 +448,29 @@ async def suggest_expectations(
     
     # Simple list prompt
     # Note: validate_batch_with_ai meant for validation map. 
-    # I should add a general 'generate_content' to ai_service.
-    
-    # Temporary direct usage for speed, refactor later
     try:
-        import google.generativeai as genai
-        from ..core.config import settings
-        if settings.GEMINI_API_KEY:
-             model = genai.GenerativeModel('gemini-2.0-flash')
-             resp = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-             return json.loads(resp.text)
+        gemini_model = await ai_service.load_gemini_model()
+        if gemini_model:
+            return await ai_service.generate_json(gemini_model, prompt)
     except Exception as e:
         print(e)
         return []
     return []
 
-@router.post("/generate_code")
-async def generate_code(suite_id: str = Body(...), session: Session = Depends(get_session)):
-    suite = session.get(ExpectationSuite, suite_id)
-    if not suite:
-        raise HTTPException(status_code=404, detail="Suite not found")
-        
-    # Simple boilerplate generation
-    expectations_json = json.dumps(suite.expectations, indent=2)
+@lru_cache(maxsize=128)
+def _render_code(suite_name: str, expectations_key: bytes) -> str:
+    """Renders the boilerplate script. Cached on the suite name and its compact expectations JSON,
+    so repeated requests for an unchanged suite skip the indent=2 dump and template formatting."""
+    expectations_json = json.dumps(orjson.loads(expectations_key), indent=2)
     
-    code = f"""
+    return f"""
 import great_expectations as gx
 
 # 1. Setup Context
 context = gx.get_context()
 
 # 2. Add Expectation Suite
-suite_name = "{suite.name}"
+suite_name = "{suite_name}"
 suite = context.add_or_update_expectation_suite(expectation_suite_name=suite_name)
 
 # 3. Add Expectations
@@ -471,4 +488,12 @@ context.save_expectation_suite(suite)
 # res = validator.validate(expectation_suite=suite)
 # print(res)
 """
-    return {"code": code}
+
+@router.post("/generate_code")
+async def generate_code(suite_id: str = Body(...), session: AsyncSession = Depends(get_session)):
+    suite = await session.get(ExpectationSuite, suite_id)
+    if not suite:
+        raise HTTPException(status_code=404, detail="Suite not found")
+        
+    # Simple boilerplate generation
+    return {"code": _render_code(suite.name, orjson.dumps(suite.expectations))}
@@ -1,9 +1,15 @@
+from pathlib import Path
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Data Validation Platform"
     DATABASE_URL: str = "sqlite:///./data.db"
+    # Logs every SQL statement (and its bound parameters) when enabled
+    DEBUG: bool = False
+    # Connection pool per external (dataset) database, used by previews and GX validation
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
     
     # AI Keys
     GEMINI_API_KEY: str = ""
@@ -14,3 +20,6 @@ class Settings(BaseSettings):
         env_file = ".env"
 
 settings = Settings()
+
+# Uploaded files live here (relative to the working directory); created once at startup
+DATA_DIR = Path("data")
@@ -0,0 +1,27 @@
+import csv
+import itertools
+from typing import Dict, Any, Iterator, List
+
+def iter_csv(path: str, n: int = 5) -> Iterator[List[str]]:
+    """Lazily yields the header row followed by up to `n` data rows."""
+    # utf-8-sig strips the BOM Excel writes ("CSV UTF-8"), as pandas' default read does,
+    # so headers match the column names validation sees
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from itertools.islice(csv.reader(f), n + 1)
+
+def row_to_dict(headers: List[str], row: List[str]) -> Dict[str, Any]:
+    # Empty cells become None, matching what the pandas-based preview returned for NaN
+    return {h: (v if v != "" else None) for h, v in zip(headers, row)}
+
+def preview_csv(path: str, n: int = 5) -> Dict[str, Any]:
+    """Reads the header and first `n` rows of a CSV without going through pandas."""
+    rows = list(iter_csv(path, n))
+
+    if not rows:
+        return {"headers": [], "rows": []}
+
+    headers = rows[0]
+    return {
+        "headers": headers,
+        "rows": [row_to_dict(headers, r) for r in rows[1:]]
+    }
@@ -1,14 +1,74 @@
-from sqlmodel import SQLModel, Session, create_engine
+import orjson
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import inspect, text, LargeBinary
+from sqlalchemy.ext.asyncio import create_async_engine
 from .config import settings
+from .json_codec import dumps as json_dumps
+from ..models.models import ZstdJSON
 
-# Use SQLite for simplicity in this demo. 
+# Async drivers for the URLs we accept in settings.DATABASE_URL
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+# Use SQLite for simplicity in this demo.
 # In production, swap with PostgreSQL based on settings.
-connect_args = {"check_same_thread": False}
-engine = create_engine(settings.DATABASE_URL, echo=True, connect_args=connect_args)
+if settings.DATABASE_URL.startswith("sqlite"):
+    engine_kwargs = {"connect_args": {"check_same_thread": False}}
+else:
+    engine_kwargs = {"pool_size": 10, "max_overflow": 20}
+
+def _json_serializer(obj) -> str:
+    # JSON columns (result_json, results_flat, ...) can be large; orjson is much faster than stdlib json
+    return json_dumps(obj).decode()
+
+engine = create_async_engine(
+    _async_url(settings.DATABASE_URL),
+    echo=settings.DEBUG,
+    pool_pre_ping=True,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    **engine_kwargs,
+)
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_upgrade_existing_tables)
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
+def _upgrade_existing_tables(conn):
+    # create_all() never alters existing tables, so add new nullable columns and indexes by hand
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                col_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            elif (
+                conn.dialect.name == "postgresql"
+                and isinstance(column.type, ZstdJSON)
+                and not isinstance(existing[column.name], LargeBinary)
+            ):
+                # Column predates compression and is still json: store its rows as UTF-8 JSON
+                # bytes, which ZstdJSON reads alongside compressed ones
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE bytea "
+                    f"USING convert_to({column.name}::text, 'UTF8')"
+                ))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    # expire_on_commit=False: attributes can't be lazily refreshed outside the session's greenlet
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
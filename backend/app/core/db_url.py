@@ -0,0 +1,114 @@
+from typing import Dict, Any
+from urllib.parse import quote_plus
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from .config import settings
+
+# Lowercased db_type (the UI sends e.g. "PostgreSQL", "SQL Server") -> canonical kind
+_DB_NORMALIZE = {
+    "postgresql": "postgres",
+    "postgres": "postgres",
+    "pg": "postgres",
+    "mysql": "mysql",
+    "mariadb": "mysql",
+    "sqlite": "sqlite",
+    "sqlite3": "sqlite",
+    "sql server": "mssql",
+    "sqlserver": "mssql",
+    "mssql": "mssql",
+    "oracle": "oracle",
+    "hive": "hive",
+    "neo4j": "neo4j",
+    "mongodb": "mongodb",
+}
+
+# Canonical kind -> SQLAlchemy driver name
+_DRIVERS = {
+    "sqlite": "sqlite",
+    "postgres": "postgresql+psycopg2",
+    "mysql": "mysql+pymysql",
+    "mssql": "mssql+pymssql",
+    "oracle": "oracle+cx_oracle",
+}
+
+# Types the UI offers that have no SQL preview/validation path yet
+_UNSUPPORTED = {
+    "hive": "Hive support is currently experimental and requires 'pyhive'.",
+    "neo4j": "Neo4j (Graph DB) is not supported via SQL preview yet.",
+    "mongodb": "MongoDB (NoSQL) is not supported via SQL preview yet.",
+}
+
+# Fail fast on unreachable hosts instead of hanging on the driver's default timeout
+_CONNECT_TIMEOUT_ARGS = {
+    "postgresql+psycopg2": {"connect_timeout": 5},
+    "mysql+pymysql": {"connect_timeout": 5},
+    "mssql+pymssql": {"login_timeout": 5},
+}
+
+def build_sqlalchemy_url(db_config: Dict[str, Any]) -> str:
+    """Builds a SQLAlchemy connection URL from a dataset's db_config."""
+    db_type = db_config.get("type", "").strip().lower()
+    host = db_config.get("host")
+    port = db_config.get("port")
+    user = db_config.get("username")
+    password = db_config.get("password")
+    db = db_config.get("database")
+
+    kind = _DB_NORMALIZE.get(db_type)
+    driver = _DRIVERS.get(kind)
+    if driver is None:
+        raise Exception(_UNSUPPORTED.get(kind) or f"Unsupported database type: {db_type}")
+
+    if driver == "sqlite":
+        # SQLite requires a file path (in host or database field)
+        db_file = host or db
+        if not db_file or db_file.strip() == "":
+            raise Exception("SQLite requires a database file path. Please specify the file path in the 'Host' or 'Database' field.")
+        return f"sqlite:///{db_file}"
+
+    if driver == "mssql+pymssql":
+        try:
+            import pymssql
+        except ImportError:
+            raise Exception("SQL Server driver (pymssql) not installed on backend.")
+    elif driver == "oracle+cx_oracle":
+        try:
+            import cx_Oracle
+        except ImportError:
+            raise Exception("Oracle driver (cx_Oracle) not installed on backend.")
+
+    # URL encode username and password to handle special characters
+    user_encoded = quote_plus(user) if user else ""
+    password_encoded = quote_plus(password) if password else ""
+    return f"{driver}://{user_encoded}:{password_encoded}@{host}:{port}/{db}"
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """create_engine() keyword arguments for a dataset database URL."""
+    driver = url.partition("://")[0]
+    if driver == "sqlite":
+        # File databases keep SQLAlchemy's default pool; connections may be used from worker threads
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": 30,
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+        "connect_args": _CONNECT_TIMEOUT_ARGS.get(driver, {}),
+    }
+
+# One engine (and connection pool) per URL for the life of the process, so repeat
+# previews reuse warm connections instead of re-creating the dialect and pool each time.
+_ENGINE_CACHE: Dict[str, Engine] = {}
+_ENGINE_LOCK = threading.Lock()
+
+def get_engine(url: str) -> Engine:
+    engine = _ENGINE_CACHE.get(url)
+    if engine is None:
+        with _ENGINE_LOCK:
+            engine = _ENGINE_CACHE.get(url)
+            if engine is None:
+                engine = create_engine(url, **engine_options(url))
+                _ENGINE_CACHE[url] = engine
+    return engine
@@ -1,66 +1,47 @@
 
 from typing import Dict, Any, List
-from sqlalchemy import create_engine, text
-import pandas as pd
-from urllib.parse import quote_plus
+from sqlalchemy import text, select, literal_column, table as table_clause
+from sqlalchemy.sql.elements import quoted_name
+from decimal import Decimal
+import re
+from .db_url import build_sqlalchemy_url, get_engine
+
+# Plain (optionally schema-qualified) identifiers only; the name is interpolated into SQL,
+# so every dot-separated part must be a non-empty identifier (128 chars overall at most)
+_TABLE_NAME_RE = re.compile(r"(?=.{1,128}$)[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*){0,2}")
+# Preview statements are dialect-neutral constructs; reusing the same object per table lets
+# each engine's compiled-statement cache hit instead of re-parsing a text() query every call
+_STMT_CACHE: Dict[str, Any] = {}
+
+def _preview_stmt(table_name: str):
+    stmt = _STMT_CACHE.get(table_name)
+    if stmt is None:
+        schema, _, name = table_name.rpartition(".")
+        # quote=False keeps the previous unquoted semantics (e.g. case folding on Postgres)
+        target = table_clause(quoted_name(name, False), schema=quoted_name(schema, False) if schema else None)
+        stmt = select(literal_column("*")).select_from(target).limit(5)
+        _STMT_CACHE[table_name] = stmt
+    return stmt
+
+def _json_value(value: Any) -> Any:
+    # NUMERIC/DECIMAL columns come back as Decimal, which the JSON response can't encode
+    # (pandas used to coerce these to float for us)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
 
 def get_db_preview(db_config: Dict[str, Any]) -> Dict[str, Any]:
-    # Construct connection string (reuse logic or centralize it)
-    # Similar to gx_service logic, should probably extract to a common util
-    
-    db_type = db_config.get("type", "").lower()
-    host = db_config.get("host")
-    port = db_config.get("port")
-    user = db_config.get("username")
-    password = db_config.get("password")
-    db = db_config.get("database")
     table = db_config.get("table")
-    
-    # URL encode username and password to handle special characters
-    user_encoded = quote_plus(user) if user else ""
-    password_encoded = quote_plus(password) if password else ""
-    
-    if "sqlite" in db_type:
-        driver = "sqlite"
-        # SQLite requires a file path (in host or database field)
-        db_file = host or db
-        if not db_file or db_file.strip() == "":
-            raise Exception("SQLite requires a database file path. Please specify the file path in the 'Host' or 'Database' field.")
-        url = f"sqlite:///{db_file}"
-    elif "postgres" in db_type:
-        url = f"postgresql+psycopg2://{user_encoded}:{password_encoded}@{host}:{port}/{db}"
-    elif "mysql" in db_type:
-        url = f"mysql+pymysql://{user_encoded}:{password_encoded}@{host}:{port}/{db}"
-    elif "sql server" in db_type or "mssql" in db_type:
-        # frequent driver: pymssql or pyodbc
-        try:
-            import pymssql
-            url = f"mssql+pymssql://{user_encoded}:{password_encoded}@{host}:{port}/{db}"
-        except ImportError:
-            raise Exception("SQL Server driver (pymssql) not installed on backend.")
-    elif "oracle" in db_type:
-        try:
-            import cx_Oracle
-            url = f"oracle+cx_oracle://{user_encoded}:{password_encoded}@{host}:{port}/{db}"
-        except ImportError:
-            raise Exception("Oracle driver (cx_Oracle) not installed on backend.")
-    elif "hive" in db_type:
-         raise Exception("Hive support is currently experimental and requires 'pyhive'.")
-    elif "neo4j" in db_type:
-         raise Exception("Neo4j (Graph DB) is not supported via SQL preview yet.")
-    elif "mongodb" in db_type:
-         raise Exception("MongoDB (NoSQL) is not supported via SQL preview yet.")
-    else:
-        raise Exception(f"Unsupported database type: {db_type}")
+    url = build_sqlalchemy_url(db_config)
         
-    engine = create_engine(url)
+    engine = get_engine(url)
     
     try:
         with engine.connect() as conn:
             # If no table specified, just test the connection
             if not table or table.strip() == "":
                 # For SQLite, verify the file exists by attempting a simple query
-                if "sqlite" in db_type:
+                if engine.dialect.name == "sqlite":
                     # Try to list tables to verify the database file is valid
                     try:
                         conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1"))
@@ -74,12 +55,16 @@ def get_db_preview(db_config: Dict[str, Any]) -> Dict[str, Any]:
                 }
             
             # Safe query for standard SQL
-            query = text(f"SELECT * FROM {table} LIMIT 5")
-            df = pd.read_sql(query, conn)
+            # Read straight from the DBAPI cursor; five rows don't need DataFrame machinery
+            table = table.strip()
+            if not _TABLE_NAME_RE.fullmatch(table):
+                raise Exception(f"Invalid table name: {table}")
+            result = conn.execute(_preview_stmt(table))
+            headers = list(result.keys())
             
             return {
-                "headers": df.columns.tolist(),
-                "rows": df.where(pd.notnull(df), None).to_dict(orient='records')
+                "headers": headers,
+                "rows": [dict(zip(headers, map(_json_value, r))) for r in result]
             }
     except Exception as e:
         raise e
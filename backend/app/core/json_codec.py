@@ -0,0 +1,8 @@
+import orjson
+
+# GX results carry numpy scalars and non-string dict keys; every stored JSON blob goes through these
+_DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def dumps(obj) -> bytes:
+    """Serializes a value for a JSON/compressed-JSON column."""
+    return orjson.dumps(obj, option=_DUMPS_OPTIONS)
@@ -1,16 +1,24 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from contextlib import asynccontextmanager
+from .core.config import DATA_DIR
 from .core.db import init_db
 from .api import endpoints
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    await init_db()
     yield
 
-app = FastAPI(title="Data Validation Platform API", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="Data Validation Platform API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Allow Frontend to communicate
 app.add_middleware(
@@ -1,5 +1,10 @@
 from typing import Optional, List, Dict, Any
 from sqlmodel import Field, SQLModel, Relationship, JSON
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+import orjson
+import zstandard
+from ..core.json_codec import dumps as json_dumps
 from uuid import UUID, uuid4
 from datetime import datetime
 
@@ -15,17 +20,56 @@ class DbConnectionConfig(SQLModel):
     password: Optional[str] = None
     table: str
 
+# --- Column Types ---
+
+# Binary jsonb on Postgres (no re-parse of JSON text on read); plain JSON elsewhere, e.g. SQLite
+PortableJSON = JSON().with_variant(JSONB(), "postgresql")
+
+# Every zstd frame starts with this magic number
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class ZstdJSON(TypeDecorator):
+    """JSON stored as a zstd-compressed blob. GX results are highly repetitive JSON and
+    compress ~10x, which cuts the bytes moved on every insert/read of a validation run.
+    Existing json columns are converted to bytea at startup (see core.db)."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zstandard.ZstdCompressor(level=3).compress(json_dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # Rows written before compression was introduced: already-decoded JSON (a column the
+        # driver still treats as json), JSON text (SQLite), or UTF-8 JSON bytes (converted column)
+        if isinstance(value, (dict, list)):
+            return value
+        if isinstance(value, str):
+            return orjson.loads(value)
+        value = bytes(value)
+        if value.startswith(_ZSTD_MAGIC):
+            value = zstandard.ZstdDecompressor().decompress(value)
+        return orjson.loads(value)
+
 # --- Models ---
 
+def _new_id() -> str:
+    # 32-char hex keys are shorter to store/index than the hyphenated form. Columns stay
+    # 36 wide since the frontend sends its own hyphenated ids (crypto.randomUUID()).
+    return uuid4().hex
+
 class DatasetBase(SQLModel):
     name: str
     # If it's a file upload
     file_path: Optional[str] = None
     # If it's a DB connection
-    db_config: Optional[Dict[str, Any]] = Field(default=None, sa_type=JSON) 
+    db_config: Optional[Dict[str, Any]] = Field(default=None, sa_type=PortableJSON) 
 
 class Dataset(DatasetBase, table=True):
-    id: Optional[str] = Field(default_factory=lambda: str(uuid4()), primary_key=True)
+    id: Optional[str] = Field(default_factory=_new_id, max_length=36, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Relationships
@@ -34,30 +78,34 @@ class Dataset(DatasetBase, table=True):
 
 class ExpectationSuiteBase(SQLModel):
     name: str
-    dataset_id: str = Field(foreign_key="dataset.id")
+    dataset_id: str = Field(foreign_key="dataset.id", max_length=36)
 
 class ExpectationSuite(ExpectationSuiteBase, table=True):
-    id: Optional[str] = Field(default_factory=lambda: str(uuid4()), primary_key=True)
+    id: Optional[str] = Field(default_factory=_new_id, max_length=36, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Store expectations as a JSON blob for simplicity, 
     # as GX expectations structure is complex and variable.
     # In a stricter schema, we would normalize this, but for this project JSON is fine.
-    expectations: List[Dict[str, Any]] = Field(default=[], sa_type=JSON) 
+    expectations: List[Dict[str, Any]] = Field(default=[], sa_type=PortableJSON) 
 
     dataset: Dataset = Relationship(back_populates="suites")
     validation_runs: List["ValidationRun"] = Relationship(back_populates="suite", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
 
 
 class ValidationRunBase(SQLModel):
-    suite_id: str = Field(foreign_key="expectationsuite.id")
+    suite_id: str = Field(foreign_key="expectationsuite.id", max_length=36)
     success: bool
     score: float
-    # Stores the full JSON result from Great Expectations
-    result_json: Dict[str, Any] = Field(default={}, sa_type=JSON)
+    # Stores the full JSON result from Great Expectations (compressed; see ZstdJSON)
+    result_json: Dict[str, Any] = Field(default={}, sa_type=ZstdJSON)
+    # Flattened per-expectation results, computed once at write time so listing runs
+    # doesn't have to re-walk result_json. None for runs stored before this column existed.
+    results_flat: Optional[List[Dict[str, Any]]] = Field(default=None, sa_type=PortableJSON)
 
 class ValidationRun(ValidationRunBase, table=True):
-    id: Optional[str] = Field(default_factory=lambda: str(uuid4()), primary_key=True)
-    run_time: datetime = Field(default_factory=datetime.utcnow)
+    id: Optional[str] = Field(default_factory=_new_id, max_length=36, primary_key=True)
+    # Indexed: the history list is ordered by run_time DESC
+    run_time: datetime = Field(default_factory=datetime.utcnow, index=True)
     
     suite: ExpectationSuite = Relationship(back_populates="validation_runs")
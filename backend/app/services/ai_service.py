@@ -1,35 +1,88 @@
 import os
-import json
-import google.generativeai as genai
-from typing import List, Dict, Any
+import orjson
+import asyncio
+import hashlib
+from functools import cache
+from typing import List, Dict, Any, Tuple
 from ..core.config import settings
 
-# Configure Gemini
-if settings.GEMINI_API_KEY:
+@cache
+def get_gemini_model():
+    """The shared Gemini model, or None when no key is configured."""
+    if not settings.GEMINI_API_KEY:
+        return None
+    # Imported on first use: the SDK pulls in grpc/protobuf, which deployments without a key never need
+    import google.generativeai as genai
+    # Configure Gemini once and reuse the model (and its HTTP transport) across requests
     genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai.GenerativeModel('gemini-2.0-flash')
 
-async def validate_batch_with_ai(values: List[Any], prompt: str) -> Dict[str, bool]:
+async def load_gemini_model():
+    """get_gemini_model() for coroutines: resolved in a worker thread, since the first call
+    imports the SDK (~1s of grpc/protobuf) and would otherwise block the event loop."""
+    return await asyncio.to_thread(get_gemini_model)
+
+# Max unique values sent to the model in one request
+AI_BATCH_SIZE = 200
+
+# Model verdicts keyed by (prompt hash, value), so repeat runs only send values not seen before.
+# Cleared wholesale once it reaches _AI_CACHE_MAX entries to bound memory.
+_AI_CACHE: Dict[Tuple[str, str], bool] = {}
+_AI_CACHE_MAX = 100_000
+
+async def generate_json(gemini_model, prompt: str) -> Any:
+    """Sends a prompt to Gemini and parses its JSON response. Requires a configured model."""
+    response = await gemini_model.generate_content_async(
+        prompt,
+        generation_config={"response_mime_type": "application/json"}
+    )
+    return orjson.loads(response.text)
+
+async def validate_batch_with_ai(gemini_model, values: List[Any], prompt: str) -> Dict[str, bool]:
+    """Maps each distinct value to the model's verdict. `gemini_model` is from load_gemini_model()."""
     # Deduplicate
-    unique_values = list(set([str(v) for v in values if v not in [None, ""]]))
+    unique_values = list({str(v) for v in values if v not in (None, "")})
     if not unique_values:
         return {}
-        
+
+    prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+    validation_map = {v: _AI_CACHE[(prompt_hash, v)] for v in unique_values if (prompt_hash, v) in _AI_CACHE}
+    unique_values = [v for v in unique_values if v not in validation_map]
+    if not unique_values:
+        return validation_map
+
+    # Large columns are split into chunks that are checked concurrently, keeping each
+    # prompt (and response) small enough for the model to answer reliably
+    chunks = [unique_values[i:i + AI_BATCH_SIZE] for i in range(0, len(unique_values), AI_BATCH_SIZE)]
+    new_results = {}
+    for chunk_map in await asyncio.gather(*[_validate_chunk(gemini_model, chunk, prompt) for chunk in chunks]):
+        new_results.update(chunk_map)
+
+    # Only real model answers are cached, not the all-False placeholder used without a key
+    if gemini_model:
+        if len(_AI_CACHE) + len(new_results) > _AI_CACHE_MAX:
+            _AI_CACHE.clear()
+        _AI_CACHE.update(((prompt_hash, v), ok) for v, ok in new_results.items())
+
+    validation_map.update(new_results)
+    return validation_map
+
+async def _validate_chunk(gemini_model, unique_values: List[str], prompt: str) -> Dict[str, bool]:
     system_prompt = """You are a strict data validation engine. 
     User will provide a list of values and a validation condition.
     You must evaluate EACH value against the condition.
-    Return a JSON object: {"results": [{"value": "val", "isValid": true}, ...]}
+    Return a JSON object pairing each value with its verdict: {"r": [["val", true], ...]}
     """
     
     user_message = f"""
     Validation Condition: "{prompt}"
-    Values: {json.dumps(unique_values)}
+    Values: {orjson.dumps(unique_values).decode()}
     """
     
     try:
         # Prefer Gemini if available acting as our primary
-        if settings.GEMINI_API_KEY:
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(
+        if gemini_model:
+            response = await gemini_model.generate_content_async(
                 f"{system_prompt}\n{user_message}", 
                 generation_config={"response_mime_type": "application/json"}
             )
@@ -40,14 +93,10 @@ async def validate_batch_with_ai(values: List[Any], prompt: str) -> Dict[str, bo
             print("No AI Key configured")
             return {v: False for v in unique_values}
             
-        result = json.loads(content)
+        result = orjson.loads(content)
         
-        # Parse to Dict
-        validation_map = {}
-        for item in result.get("results", []):
-            validation_map[item["value"]] = item["isValid"]
-            
-        return validation_map
+        # Parse to Dict: [value, isValid] pairs (compact schema, ~half the bytes of keyed objects)
+        return dict(result.get("r", []))
 
     except Exception as e:
         print(f"AI Error: {e}")